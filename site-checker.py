@@ -13,6 +13,12 @@
 #  2023Oct13 - Added color to PASS and FAIL
 #  2023Oct17 - Added session totals
 #              Added loadavg
+#  2026Oct15 - Switched option parsing to argparse
+#              Run the checks for each instance concurrently
+#              Fetch status pages in-process instead of wget
+#              Run check_http without a shell
+#              Look up all the hostnames at once before the checks
+#              Check the sites concurrently
 #
 #################################################
 
@@ -22,79 +28,116 @@ import pprint
 import os
 import re
 import sys
-import getopt
-from pathlib import Path
+import time
+import shlex
+import socket
+import subprocess
+import argparse
+import threading
+import asyncio
+import base64
+import http.client
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 #import dns.resolver
-import dns.name
 import dns.message
 import dns.query
-import dns.flags
+import dns.rdatatype
+import dns.inet
+import dns.exception
+import dns.asyncquery
+
+# Use the libyaml C loader when available
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 # List modules
 #help('modules')
 
 ## Variables ##
 
-site_input_list = [ ]
+dns_cache = { }
+dns_sock  = None
+dns_lock  = threading.Lock()
 conf = {
   'DEBUG':              0,
   'VERBOSE':            0,
   'username':           'xxxx',
   'password':           'xxxx',
-  'AUTH':               '',
+  'AUTH':               [ ],
   'WARN':               '3',
   'CRIT':               '4',
   'TIMEOUT':            '5',
   'STRING':             'PAGE_LOAD_COMPLETED',
-  'SSL_OPTS':           ' --ssl=1.2 --verify-host --sni',
-  'SSL_OPTS2':          ' --ssl=1.2 --verify-host --sni --certificate=30 --continue-after-certificate',
+  'SSL_OPTS':           [ '--ssl=1.2', '--verify-host', '--sni' ],
+  'SSL_OPTS2':          [ '--ssl=1.2', '--verify-host', '--sni', '--certificate=30', '--continue-after-certificate' ],
   'CHECK_HTTP_BIN':     os.environ.get('HOME') + '/bin/check_http',
-  'WGET_BIN':           '/usr/bin/wget',
   'SITES_FILE':         'sites.yml',
-  'DEVONLY':            0,
-  'TSTONLY':            0,
-  'STGONLY':            0,
-  'PREONLY':            0,
-  'PRDONLY':            0,
-  'PUBONLY':            0,
-  'INTONLY':            0,
+  'ENVS':               frozenset( ),
   'DNS_SERVER':         'x.x.x.x',
+  'DNS_CACHE_TTL':      900,
+  'DNS_TIMEOUT':        3,
+  'DNS_WORKERS':        64,
   'MODE':               'CHECK',
+  'WORKERS':            16,
+  'SITE_WORKERS':       8,
   'RED':                '\033[0;31m',
   'GREED':              '\033[0;32m',
   'NOCOLOR':            '\033[0m'
   }
 
-conf['AUTH'] = ' --authorization=' + '"' + conf['username'] + ':' + conf['password'] + '"';
+conf['AUTH'] = [ '--authorization=' + conf['username'] + ':' + conf['password'] ]
+conf['HTTP_HEADERS'] = { 'Authorization': 'Basic ' + base64.b64encode( ( conf['username'] + ':' + conf['password'] ).encode() ).decode() }
+
+# Precompiled patterns
+RE_PIPE_DASH  = re.compile( '\\|| - ' )
+RE_DIGITS     = re.compile( '\\d+' )
+RE_TAGS       = re.compile( '<[^>]*>' )
+
+# DNS query settings
+DNS_QUERY_TYPE = dns.rdatatype.A
 
 #################################################
 ## Functions ##
 
 #######################
-def showhelp( ):
+def build_check_http_argv( ):
     ## Main ##
-    sys.stdout.write( "Usage: [options] <site> <site> <site>\n" )
-    sys.stdout.write( "  -h --help Usage     Show help\n" )
-    sys.stdout.write( "  -v --verbose        Enable verbose output\n" )
-    sys.stdout.write( "  -d --debug          Enable debug output\n" )
-    sys.stdout.write( "  -f --file=<file>    Site data file\n" )
-    sys.stdout.write( "     --dev            Only dev instances\n" )
-    sys.stdout.write( "     --tst            Only tst instances\n" )
-    sys.stdout.write( "     --stg            Only stg instances\n" )
-    sys.stdout.write( "     --pre            Only pre instances\n" )
-    sys.stdout.write( "     --prd            Only prd instances\n" )
-    sys.stdout.write( "     --public         Only public instances\n" )
-    sys.stdout.write( "     --internal       Only internal instances\n" )
-    sys.stdout.write( "     --noauth         No authentication\n" )
-    sys.stdout.write( "     --list           List sites\n" )
-    sys.stdout.write( "     --list-all       List all sites instances\n" )
-    sys.stdout.write( "\n" )
+    # Everything but the per-probe target is fixed once the options are known
+    common = conf['AUTH'] + [ '--warning='  + conf['WARN'],
+                              '--critical=' + conf['CRIT'],
+                              '--timeout='  + conf['TIMEOUT'] ]
+    if( conf['VERBOSE'] ): common.append( '--show-url' )
+
+    conf['CHECK_HTTP_ARGV']  = [ conf['CHECK_HTTP_BIN'] ] + common
+    conf['CHECK_HTTPS_ARGV'] = [ conf['CHECK_HTTP_BIN'] ] + conf['SSL_OPTS'] + common
 
     ## Return ##
-    exit( 1 )
     return( )
 
+#######################
+def run_check_http( command ):
+    ## Variables ##
+
+    output = ''
+
+    ## Main ##
+    # Run Command #
+    if( conf['DEBUG'] ): print( 'Command: ', shlex.join( command ) )
+    try:
+        result = subprocess.run( command, capture_output=True, text=True, timeout=int( conf['TIMEOUT'] ) + 1 )
+        output = result.stdout.strip( "\n" );
+    except subprocess.TimeoutExpired:
+        output = 'check_http timed out after ' + str( int( conf['TIMEOUT'] ) + 1 ) + ' seconds'
+    except OSError as error:
+        output = 'check_http failed: ' + str( error )
+
+    ## Return ##
+    return( output )
+
 #######################
 def check_http_str( host, ipaddr, port, path, string ):
     ## Variables ##
@@ -104,73 +147,55 @@ def check_http_str( host, ipaddr, port, path, string ):
     code   = ''
 
     ## Main ##
-    if( port == '443' ):
-        command = conf['CHECK_HTTP_BIN'] \
-                + conf['SSL_OPTS'] \
-                + conf['AUTH'] \
-                + ' --hostname='   + host \
-                + ' --IP-address=' + ipaddr \
-                + ' --port='       + port \
-                + ' --warning='    + conf['WARN'] \
-                + ' --critical='   + conf['CRIT'] \
-                + ' --timeout='    + conf['TIMEOUT'] \
-                + ' --uri='        + path \
-                + ' --string="'    + string + '"' \
-                + ' --onredirect=warning'
-    else:
-        command = conf['CHECK_HTTP_BIN'] \
-                + conf['AUTH'] \
-                + ' --hostname='   + host \
-                + ' --IP-address=' + ipaddr \
-                + ' --port='       + port \
-                + ' --warning='    + conf['WARN'] \
-                + ' --critical='   + conf['CRIT'] \
-                + ' --timeout='    + conf['TIMEOUT'] \
-                + ' --uri='        + path \
-                + ' --string='     + string \
-                + ' --onredirect=warning'
-
-    if( conf['VERBOSE'] ): command = command + ' --show-url'
+    if( port == '443' ): command = conf['CHECK_HTTPS_ARGV']
+    else:                command = conf['CHECK_HTTP_ARGV']
+    command = command + [
+                 '--hostname='   + host,
+                 '--IP-address=' + ipaddr,
+                 '--port='       + port,
+                 '--uri='        + path,
+                 '--string='     + string,
+                 '--onredirect=warning' ]
 
     # Run Command #
-    if conf['DEBUG']: print( 'Command: ', command )
-    stream = os.popen( command )
-    output = stream.read().strip( "\n" );
+    output = run_check_http( command )
 
     if( conf['DEBUG'] ): print( "Debug: ", output );
 
     # Return status
-    if( re.match('^HTTP OK:',output ) ):
-        output_split = re.split( '\|| - ', output )
+    if( output.startswith( 'HTTP OK:' ) ):
+        output_split = RE_PIPE_DASH.split( output )
         # Item number 3 should be the http status code
-        if( len( re.split( ' ', output_split[0] ) ) >= 4 ): code = ( re.split( ' ', output_split[0] ) )[3];
+        status_line = output_split[0].split( ' ' )
+        if( len( status_line ) >= 4 ): code = status_line[3];
         else: code = output;
-        if( re.match( '^2', code ) ):
+        if( code.startswith( '2' ) ):
             if( conf['VERBOSE'] ): status = '\033[0;32mPASS\033[0m ' + code + ', ' + output_split[1]
             else:                  status = '\033[0;32mPASS\033[0m ' + code;
         else:
             if( conf['VERBOSE'] ): status = '\033[0;31mFAIL\033[0m ' + code + ', ' + output_split[1]
             else:                  status = '\033[0;31mFAIL\033[0m ' + code;
-    elif( re.match('^HTTP WARN:', output ) ):
-        output_split = re.split( '\|| - ', output )
+    elif( output.startswith( 'HTTP WARN:' ) ):
+        output_split = RE_PIPE_DASH.split( output )
         # Item number 3 should be the http status code
-        if( len( re.split( ' ', output_split[0] ) ) >= 4 ): code = ( re.split( ' ', output_split[0] ) )[3];
+        status_line = output_split[0].split( ' ' )
+        if( len( status_line ) >= 4 ): code = status_line[3];
         else: code = output;
-        if( re.match( '^2', code ) ):
+        if( code.startswith( '2' ) ):
             if( conf['VERBOSE'] ): status = '\033[0;32mPASS\033[0m ' + code + ', ' + output_split[1]
             else:                  status = '\033[0;32mPASS\033[0m ' + code;
         else:
             if( conf['VERBOSE'] ): status = '\033[0;31mFAIL\033[0m ' + code + ', ' + output_split[1]
             else:                  status = '\033[0;31mFAIL\033[0m ' + code;
-    elif( re.match('CRITICAL', output ) ):
+    elif( output.startswith( 'CRITICAL' ) ):
         if( conf['VERBOSE'] ):
-            output_split = re.split( '\|', output )
+            output_split = output.split( '|' )
             status = '\033[0;31mFAIL\033[0m ' + output_split[0];
         else:
-            output_split = re.split( '\|| - ', output )
+            output_split = RE_PIPE_DASH.split( output )
             status = '\033[0;31mFAIL\033[0m ' + output_split[0]
     else:
-        output_split = re.split( '\|| - ', output )
+        output_split = RE_PIPE_DASH.split( output )
         if( conf['VERBOSE'] ): status = '\033[0;31mFAIL\033[0m ' + output
         else:                  status = '\033[0;31mFAIL\033[0m ' + output_split[0]
 
@@ -186,69 +211,52 @@ def check_http_redirect( host, ipaddr, port, path ):
     status = ''
 
     ## Main ##
-    if( port == '443' ):
-        command = conf['CHECK_HTTP_BIN'] \
-                + conf['SSL_OPTS'] \
-                + conf['AUTH'] \
-                + ' --hostname='   + host \
-                + ' --IP-address=' + ipaddr \
-                + ' --port='       + port \
-                + ' --warning='    + conf['WARN'] \
-                + ' --critical='   + conf['CRIT'] \
-                + ' --timeout='    + conf['TIMEOUT'] \
-                + ' --uri='        + path \
-                + ' --onredirect=ok'
-    else:
-        command = conf['CHECK_HTTP_BIN'] \
-                + conf['AUTH'] \
-                + ' --hostname='   + host \
-                + ' --IP-address=' + ipaddr \
-                + ' --port='       + port \
-                + ' --warning='    + conf['WARN'] \
-                + ' --critical='   + conf['CRIT'] \
-                + ' --timeout='    + conf['TIMEOUT'] \
-                + ' --uri='        + path \
-                + ' --onredirect=ok'
-
-    if( conf['VERBOSE'] ): command = command + ' --show-url'
+    if( port == '443' ): command = conf['CHECK_HTTPS_ARGV']
+    else:                command = conf['CHECK_HTTP_ARGV']
+    command = command + [
+                 '--hostname='   + host,
+                 '--IP-address=' + ipaddr,
+                 '--port='       + port,
+                 '--uri='        + path,
+                 '--onredirect=ok' ]
 
     # Run Command #
-    if conf['DEBUG']: print( 'Command: ', command )
-    stream = os.popen( command )
-    output = stream.read().strip( "\n" );
+    output = run_check_http( command )
 
     # Return status
-    if( re.match( '^HTTP OK:',output ) ):
-        output_split = re.split( '\|| - ', output )
+    if( output.startswith( 'HTTP OK:' ) ):
+        output_split = RE_PIPE_DASH.split( output )
         # Item number 3 should be the http status code
-        if( len( re.split( ' ', output_split[0] ) ) >= 4 ): code = ( re.split( ' ', output_split[0] ) )[3];
+        status_line = output_split[0].split( ' ' )
+        if( len( status_line ) >= 4 ): code = status_line[3];
         else: code = output;
-        if( re.match( '^3', code ) ):
+        if( code.startswith( '3' ) ):
             if( conf['VERBOSE'] ): status = '\033[0;32mPASS\033[0m ' + code + ', ' + output_split[1]
             else:                  status = '\033[0;32mPASS\033[0m ' + code;
         else:
             if( conf['VERBOSE'] ): status = '\033[0;31mFAIL\033[0m ' + code + ', ' + output_split[1]
             else:                  status = '\033[0;31mFAIL\033[0m ' + code;
-    elif( re.match('^HTTP WARN:', output ) ):
-        output_split = re.split( '\|| - ', output )
+    elif( output.startswith( 'HTTP WARN:' ) ):
+        output_split = RE_PIPE_DASH.split( output )
         # Item number 3 should be the http status code
-        if( len( re.split( ' ', output_split[0] ) ) >= 4 ): code = ( re.split( ' ', output_split[0] ) )[3];
+        status_line = output_split[0].split( ' ' )
+        if( len( status_line ) >= 4 ): code = status_line[3];
         else: code = output;
-        if( re.match( '^3', code ) ):
+        if( code.startswith( '3' ) ):
             if( conf['VERBOSE'] ): status = '\033[0;32mPASS\033[0m ' + code + ', ' + output_split[1]
             else:                  status = '\033[0;32mPASS\033[0m ' + code;
         else:
             if( conf['VERBOSE'] ): status = '\033[0;31mFAIL\033[0m ' + code + ', ' + output_split[1]
             else:                  status = '\033[0;31mFAIL\033[0m ' + code;
-    elif( re.match('CRITICAL', output ) ):
+    elif( output.startswith( 'CRITICAL' ) ):
         if( conf['VERBOSE'] ):
-            output_split = re.split( '\|', output )
+            output_split = output.split( '|' )
             status = '\033[0;31mFAIL\033[0m ' + output_split[0];
         else:
-            output_split = re.split( '\|| - ', output )
+            output_split = RE_PIPE_DASH.split( output )
             status = '\033[0;31mFAIL\033[0m ' + output_split[0]
     else:
-        output_split = re.split( '\|| - ', output )
+        output_split = RE_PIPE_DASH.split( output )
         if( conf['VERBOSE'] ): status = '\033[0;31mFAIL\033[0m ' + output
         else:                  status = '\033[0;31mFAIL\033[0m ' + output_split[0]
 
@@ -263,336 +271,484 @@ def check_http_cmd( host, ipaddr, port, path ):
     status = ''
 
     ## Main ##
-    if( port == '443' ):
-        url = 'https://' + host + ':' + port + path
-        command = conf['CHECK_HTTP_BIN'] \
-                + conf['SSL_OPTS'] \
-                + conf['AUTH'] \
-                + ' --hostname='   + host \
-                + ' --IP-address=' + ipaddr \
-                + ' --port='       + port \
-                + ' --warning='    + conf['WARN'] \
-                + ' --critical='   + conf['CRIT'] \
-                + ' --timeout='    + conf['TIMEOUT'] \
-                + ' --uri='        + path \
-                + ' --onredirect=critical'
-    else:
-        url = 'http://' + host + ':' + port + path
-        command = conf['CHECK_HTTP_BIN'] \
-                + conf['AUTH'] \
-                + ' --hostname='   + host \
-                + ' --IP-address=' + ipaddr \
-                + ' --port='       + port \
-                + ' --warning='    + conf['WARN'] \
-                + ' --critical='   + conf['CRIT'] \
-                + ' --timeout='    + conf['TIMEOUT'] \
-                + ' --uri='        + path \
-                + ' --onredirect=critical'
-
-    if( conf['VERBOSE'] ): command = command + ' --show-url'
+    if( port == '443' ): command = conf['CHECK_HTTPS_ARGV']
+    else:                command = conf['CHECK_HTTP_ARGV']
+    command = command + [
+                 '--hostname='   + host,
+                 '--IP-address=' + ipaddr,
+                 '--port='       + port,
+                 '--uri='        + path,
+                 '--onredirect=critical' ]
 
     # Run Command #
-    if conf['DEBUG']: print( 'Command: ', command )
-    stream = os.popen( command )
-    output = stream.read().strip( "\n" );
+    output = run_check_http( command )
 
     # Return status
-    if( re.match('^HTTP OK:',output ) ):
-        output_split = re.split( '\|| - ', output )
+    if( output.startswith( 'HTTP OK:' ) ):
+        output_split = RE_PIPE_DASH.split( output )
         # Item number 3 should be the http status code
-        if( len( re.split( ' ', output_split[0] ) ) >= 4 ): code = ( re.split( ' ', output_split[0] ) )[3];
+        status_line = output_split[0].split( ' ' )
+        if( len( status_line ) >= 4 ): code = status_line[3];
         else: code = output;
         if( conf['VERBOSE'] ): status = '\033[0;32mPASS\033[0m ' + code + ', ' + output_split[1]
         else:                  status = '\033[0;32mPASS\033[0m ' + code;
-    elif( re.match('^HTTP WARN:', output ) ):
-        output_split = re.split( '\|| - ', output )
+    elif( output.startswith( 'HTTP WARN:' ) ):
+        output_split = RE_PIPE_DASH.split( output )
         # Item number 3 should be the http status code
-        if( len( re.split( ' ', output_split[0] ) ) >= 4 ): code = ( re.split( ' ', output_split[0] ) )[3];
+        status_line = output_split[0].split( ' ' )
+        if( len( status_line ) >= 4 ): code = status_line[3];
         else: code = output;
         if( conf['VERBOSE'] ): status = '\033[0;32mPASS\033[0m ' + code + ', ' + output_split[1]
         else:                  status = '\033[0;32mPASS\033[0m ' + code;
-    elif( re.match('CRITICAL', output ) ):
+    elif( output.startswith( 'CRITICAL' ) ):
         if( conf['VERBOSE'] ): status = '\033[0;31mFAIL\033[0m ' + output;
         else:
-            output_split = re.split( '\|| - ', output )
+            output_split = RE_PIPE_DASH.split( output )
             status = '\033[0;31mFAIL\033[0m ' + output_split[0] + ' ' + output_split[1]
     else:
         if( conf['VERBOSE'] ): status = '\033[0;31mFAIL\033[0m ' + output
         else:
-            output_split = re.split( '\|', output );
+            output_split = output.split( '|' );
             status = '\033[0;31mFAIL\033[0m ' + output;
 
     ## Return ##
     return( status )
 
 #######################
-def wget_match_str( host, port, path, pattern ):
+def http_get( host, port, path ):
     ## Variables ##
 
     url = ''
-    output = ''
+    page = ''
 
     ## Main ##
     if( port == '443' ): url = 'https://' + host + path
     else: url = 'http://' + host + path
 
-    command = conf['WGET_BIN'] + ' -q ' + ' --http-user=' + conf['username'] + ' --http-password=' + conf['password'] + ' ' + url + ' -O - | grep "' + pattern + '"'
+    # Fetch the page #
+    if( conf['DEBUG'] ): print( 'Fetch: ', url )
+    request = urllib.request.Request( url, headers=conf['HTTP_HEADERS'] )
+    try:
+        with urllib.request.urlopen( request, timeout=int( conf['TIMEOUT'] ) ) as response:
+            page = response.read().decode( 'utf-8', 'replace' )
+    except ( OSError, http.client.HTTPException ) as error:
+        if( conf['DEBUG'] ): print( "Debug: ", url, error );
 
-    # Run Command #
-    if( conf['DEBUG'] ): print( 'Command: ', command )
-    stream = os.popen( command )
-    output = stream.read()
-    output = output.strip( "\n" );
+    ## Return ##
+    return( page )
+
+#######################
+def match_str( page, pattern ):
+    ## Main ##
+    # Keep the matching lines, like grep
+    output = "\n".join( line for line in page.splitlines() if pattern in line )
 
     ## Return ##
     return( output )
 
 #######################
-def dns_lookup( domain ):
+def check_server_status( host, port ):
+    ## Variables ##
+
+    requests = ''
+    load_avg = ''
+
+    ## Main ##
+    status = check_http_cmd( host, host, port, '/server-status' );
+    if( 'PASS' in status ):
+        # One fetch of the status page serves both lookups
+        page = http_get( host, '80', '/server-status' )
+        requests = match_str( page, 'requests currently being processed' )
+        requests = requests.removeprefix( '<dt>' ).removesuffix( '</dt>' )
+        requests = requests.replace( 'requests currently being processed', 'current' )
+        load_avg = match_str( page, 'Server load:' )
+        load_avg = load_avg.removeprefix( '<dt>Server ' ).removesuffix( '</dt>' )
+
+    ## Return ##
+    return( status, requests, load_avg )
+
+#######################
+def check_php_info( host ):
     ## Variables ##
 
-    value = ''
+    version = ''
 
     ## Main ##
+    status = check_http_str( host, host, '443', '/php-info', 'PHP Version' );
+    if( 'PASS' in status ):
+        version = match_str( http_get( host, '80', '/php-info' ), 'PHP Version <' )
+        version = RE_TAGS.sub( '', version ).replace( 'PHP Version ', '' ).replace( ' ', '' )
+
+    ## Return ##
+    return( status, version )
 
-    #command = 'host -r ' + host + ' | head -1'
-    #if conf['DEBUG']: print( 'Command: ', command )
-    #stream = os.popen( command )
-    #value = dns.query( host )
-    #value = dns.query.udp = udp( host, '8.8.8.8', timeout=4, port=53, source=None, source_port=0, ignore_unexpected=False, one_rr_per_rrset=False, ignore_trailing=False, raise_on_truncation=False, sock=None)
-
-    name_server = '65.175.128.181'
-    ADDITIONAL_RDCLASS = 65535
-
-    domain = dns.name.from_text( domain )
-    if not domain.is_absolute():
-        domain = domain.concatenate(dns.name.root)
-
-    request = dns.message.make_query(domain, dns.rdatatype.ANY)
-    request.flags |= dns.flags.AD
-    request.flags ^= dns.flags.RD
-    request.find_rrset(request.additional, dns.name.root, ADDITIONAL_RDCLASS, dns.rdatatype.OPT, create=True, force_unique=True)
-    response = dns.query.udp(request, name_server)
-
-    #pprint.pprint( response.answer )
-    #print response.answer
-    #print( 'Answer: ', response.answer )
-    #print( response.additional )
-    #print( response.authority )
-    #print( 'List0:   ', response.answer[0] )
-    #print( 'List00   ', response.answer[0][0] )
-    #print( 'Type:    ', type( response.answer ) )
-    #print( 'Type:    ', type( response.answer[0] ) )
-    #print( 'to_text: ', response.answer[0].to_text )
-    #print( 'get_rrset: ' , response.get_rrset ( response.answer, domain ) )
-    #print( response.answer.to_text )
+#######################
+def check_server( server_name ):
+    ## Main ##
+    check = check_http_str( server_name, server_name, '80',  '/check', conf['STRING'] )
+    status, requests, load_avg = check_server_status( server_name, '80' )
 
     ## Return ##
+    return( check, status, requests, load_avg )
 
-    return( response.answer[0] )
+#######################
+def start_checks( pool, hostname, short_hostname, site_conf ):
+    ## Variables ##
 
-#################################################
-## Input Options ##
-
-# Parsing argument
-arglist = sys.argv[1:]
-#arguments, values = getopt.getopt(argumentList, "hvdf:", [ "help", "verbose", "debug", "file=", "dev", "stg", "pre", "prd" ] )
-
-# checking each argument
-while( len( arglist ) > 0 ):
-   if   arglist[0] in ["-h", "--help"]:     showhelp();
-   elif arglist[0] in ["-v", "--verbose"]:  conf['VERBOSE']   += 1;          arglist.pop(0);
-   elif arglist[0] in ["-d", "--debug"]:    conf['DEBUG']     += 1;          arglist.pop(0);
-   elif arglist[0] in ["-f", "--file"]:     conf['SITES_FILE'] = arglist[1]; arglist.pop(0); arglist.pop(0);
-   elif arglist[0] in [      "--dev"]:      conf['DEVONLY']   += 1;          arglist.pop(0);
-   elif arglist[0] in [      "--tst"]:      conf['TSTONLY']   += 1;          arglist.pop(0);
-   elif arglist[0] in [      "--stg"]:      conf['STGONLY']   += 1;          arglist.pop(0);
-   elif arglist[0] in [      "--pre"]:      conf['PREONLY']   += 1;          arglist.pop(0);
-   elif arglist[0] in [      "--prd"]:      conf['PRDONLY']   += 1;          arglist.pop(0);
-   elif arglist[0] in [      "--public"]:   conf['PUBONLY']   += 1;          arglist.pop(0);
-   elif arglist[0] in [      "--internal"]: conf['INTONLY']   += 1;          arglist.pop(0);
-   elif arglist[0] in [      "--noauth"]:   conf['AUTH']       = '';         arglist.pop(0);
-   elif arglist[0] in [      "--list"]:     conf['MODE']       = 'LIST';     arglist.pop(0);
-   elif arglist[0] in [      "--list-all"]: conf['MODE']       = 'LISTALL';  arglist.pop(0);
-   else:                                    site_input_list.append( arglist[0] ); arglist.pop(0);
+    checks = { }
 
-#################################################
-## Main ##
+    ## Main ##
+    # Submit every probe for this instance up front, the caller collects the results in order
+    if( site_conf['check-string'] == True ):
+        if( 'path' in site_conf ):
+            checks['string']     = pool.submit( check_http_str,      hostname, hostname, '443', site_conf['path'], conf['STRING'] )
+    if( site_conf['check-redirect'] == True ):
+        if( 'redirect' in site_conf ):
+            checks['redirect']   = pool.submit( check_http_redirect, hostname, hostname, '443', '/' )
+    if( site_conf['check-http-redir'] == True ):
+        checks['http-redir']     = pool.submit( check_http_redirect, hostname, hostname, '80',  '/' )
+    if( site_conf['check-http'] == True ):
+        checks['http']           = pool.submit( check_http_str,      hostname, hostname, '80',  '/check', conf['STRING'] )
+    if( site_conf['check-https'] == True ):
+        checks['https']          = pool.submit( check_http_str,      hostname, hostname, '443', '/check', conf['STRING'] )
+    if( site_conf['check-status'] == True ):
+        checks['status']         = pool.submit( check_server_status, hostname, '443' )
+    if( site_conf['check-info'] == True ):
+        checks['info']           = pool.submit( check_http_cmd,      hostname, hostname, '443', '/server-info' )
+    if( site_conf['check-php'] == True ):
+        checks['php']            = pool.submit( check_php_info,      hostname )
+    if( site_conf['check-lb'] == True ):
+        if( 'lb' in site_conf ):
+            checks['lb']         = pool.submit( check_http_cmd,      hostname, site_conf['lb'], '443', '/check' )
+    if( site_conf['check-servers'] == True ):
+        if( 'servers' in site_conf ):
+            checks['servers'] = [ ]
+            for number in site_conf['servers']:
+                server_name = short_hostname + number + '.' + site_conf['domain'];
+                checks['servers'].append( ( number, pool.submit( check_server, server_name ) ) )
+    if( site_conf['check-health'] == True ):
+        if( 'health' in site_conf ):
+            checks['health']     = pool.submit( check_http_cmd,      hostname, hostname, '443', site_conf['health'] )
+
+    ## Return ##
+    return( checks )
+
+#######################
+def check_prod_status( prod_status ):
+    ## Main ##
+    # Only the selected instances, or all of them when none are selected
+    do_check_this_prod_status = ( not conf['ENVS'] ) or ( prod_status in conf['ENVS'] )
+
+    ## Return ##
+    return( do_check_this_prod_status )
 
-if conf['DEBUG']: print( 'Input list: ', site_input_list, len(site_input_list) )
-
-# Load yaml file site data
-sites_data = yaml.safe_load(Path( conf['SITES_FILE'] ).read_text())
-
-if( conf['DEBUG'] > 1 ):
-    print( "Site data dump:\n" )
-    pprint.pprint( sites_data )
-    print( "\n" )
-
-if( conf['DEBUG'] ):
-    print( "Config data dump:\n" )
-    pprint.pprint( conf )
-    print( "\n" )
-
-# List mode
-if( conf['MODE'] == 'LIST' ):
-    for site in sites_data["sites"]:
-       print( site, sep='', end='\n' );
-
-# List mode
-if( conf['MODE'] == 'LISTALL' ):
-    for site in sites_data["sites"]:
-        for prod_status in sites_data["sites"][site].keys():
-            print( site, '-', prod_status, sep='', end='\n' );
-
-# Check mode, Parse all sites
-if( conf['MODE'] == 'CHECK' ):
-  for site in sites_data["sites"]:
-    # Are we picking from a list of sites, or doing all the sites?
-    do_check_this_site = 0
-    if( len( site_input_list ) > 0 ):
-      if( site in site_input_list ):
-        do_check_this_site = 1
-    else: do_check_this_site = 1
-
-    if( do_check_this_site == 1 ):
-        print( '################################' );
-        print( 'App: ' + site )
-        for prod_status in sites_data["sites"][site].keys():
-            do_check_this_prod_status = 0
-            if( ( conf['DEVONLY'] == 1 ) and ( prod_status == 'dev'    ) ): do_check_this_prod_status = 1
-            if( ( conf['TSTONLY'] == 1 ) and ( prod_status == 'tst'    ) ): do_check_this_prod_status = 1
-            if( ( conf['STGONLY'] == 1 ) and ( prod_status == 'stg'    ) ): do_check_this_prod_status = 1
-            if( ( conf['PREONLY'] == 1 ) and ( prod_status == 'pre'    ) ): do_check_this_prod_status = 1
-            if( ( conf['PRDONLY'] == 1 ) and ( prod_status == 'prd'    ) ): do_check_this_prod_status = 1
-            if( ( conf['PUBONLY'] == 1 ) and ( prod_status == 'public' ) ): do_check_this_prod_status = 1
-            if( ( conf['INTONLY'] == 1 ) and ( prod_status == 'internal' ) ): do_check_this_prod_status = 1
-
-            # If none are set, do them all
-            if( ( conf['DEVONLY'] or conf['TSTONLY'] or conf['STGONLY'] or conf['PREONLY'] or conf['PRDONLY'] or conf['PUBONLY'] or conf['INTONLY'] ) != 1 ): do_check_this_prod_status = 1
-
-            if( do_check_this_prod_status == 1 ):
-                # Start a new prod_statusance
-                sys.stdout.write( ' ' + prod_status + ":\n" )
-                #if( prod_status == 'public' ): prod_status = 'prd';
-
-                # Build the hostname
-                if( 'host' in sites_data['sites'][site][prod_status] ):
-                    if( sites_data['sites'][site][prod_status]['host'] == '' ):
-                        hostname       = sites_data['sites'][site][prod_status]['domain'];
-                        short_hostname = sites_data['sites'][site][prod_status]['domain'];
+#######################
+def build_hostname( site, prod_status, site_conf ):
+    ## Main ##
+    if( 'host' in site_conf ):
+        if( site_conf['host'] == '' ):
+            hostname       = site_conf['domain'];
+            short_hostname = site_conf['domain'];
+        else:
+            hostname       = site_conf['host'] + '.' + site_conf['domain'];
+            short_hostname = site_conf['host'];
+    else:
+        hostname       = site + '-' + prod_status + '.' + site_conf['domain'];
+        short_hostname = site + '-' + prod_status;
+
+    ## Return ##
+    return( hostname, short_hostname )
+
+#######################
+def make_dns_query( hostname ):
+    ## Main ##
+    # make_query() makes the name absolute itself, no need to parse it first
+    dns_request = dns.message.make_query( hostname, DNS_QUERY_TYPE )
+
+    ## Return ##
+    return( dns_request )
+
+#######################
+async def dns_query_one( dns_slots, dns_request ):
+    ## Main ##
+    # Hold a slot while the query's socket is open
+    async with dns_slots:
+        dns_response = await dns.asyncquery.udp( dns_request, conf['DNS_SERVER'], timeout=conf['DNS_TIMEOUT'] )
+
+    ## Return ##
+    return( dns_response )
+
+#######################
+async def dns_query_all( dns_requests ):
+    ## Variables ##
+
+    dns_slots = asyncio.Semaphore( conf['DNS_WORKERS'] )
+
+    ## Main ##
+    # Every query gets its own socket so the answers can arrive in any order,
+    # at most DNS_WORKERS of them are open at once
+    dns_responses = await asyncio.gather( *[ dns_query_one( dns_slots, dns_request ) for dns_request in dns_requests ], return_exceptions=True )
+
+    ## Return ##
+    return( dns_responses )
+
+#######################
+def dns_prefetch( hostnames ):
+    ## Variables ##
+
+    hostnames = list( dict.fromkeys( hostnames ) )
+    now = time.monotonic()
+
+    ## Main ##
+    # Send all the lookups at once and seed the cache, dns_query() then answers from it
+    dns_requests = [ make_dns_query( hostname ) for hostname in hostnames ]
+    dns_responses = asyncio.run( dns_query_all( dns_requests ) )
+    for hostname, dns_request, dns_response in zip( hostnames, dns_requests, dns_responses ):
+        # No answer, report it as an empty response
+        if( isinstance( dns_response, dns.exception.Timeout ) ): dns_response = dns.message.make_response( dns_request )
+        if( isinstance( dns_response, dns.message.Message ) ):
+            dns_cache[hostname] = ( now + conf['DNS_CACHE_TTL'], dns_response )
+
+    ## Return ##
+    return( )
+
+#######################
+def dns_query( hostname ):
+    ## Variables ##
+
+    global dns_sock
+    now = time.monotonic()
+
+    ## Main ##
+    # Reuse a cached response until it expires
+    cached = dns_cache.get( hostname )
+    if( cached and cached[0] > now ): return( cached[1] )
+
+    # Fallback for hostnames the prefetch could not look up,
+    # all queries go out over one socket, one site at a time
+    dns_request = make_dns_query( hostname )
+    with dns_lock:
+        if( dns_sock is None ):
+            dns_sock = socket.socket( dns.inet.af_for_address( conf['DNS_SERVER'] ), socket.SOCK_DGRAM )
+            dns_sock.setblocking( False )
+
+        try:
+            # Late replies to earlier timed out queries can still be queued on the socket, skip them
+            dns_response = dns.query.udp( dns_request, conf['DNS_SERVER'], timeout=conf['DNS_TIMEOUT'], sock=dns_sock, ignore_errors=True )
+        except dns.exception.Timeout:
+            # No answer, cache it as an empty response like dns_prefetch() does
+            dns_response = dns.message.make_response( dns_request )
+        except dns.query.BadResponse:
+            # No usable answer, report it as an empty response but try again next time
+            return( dns.message.make_response( dns_request ) )
+        dns_cache[hostname] = ( now + conf['DNS_CACHE_TTL'], dns_response )
+
+    ## Return ##
+    return( dns_response )
+
+#######################
+def check_site( probe_pool, site, site_data ):
+    ## Variables ##
+
+    output = [ ]
+
+    ## Main ##
+    output.append( '################################\n' )
+    output.append( 'App: ' + site + "\n" )
+    for prod_status, site_conf in site_data.items():
+        if( check_prod_status( prod_status ) ):
+            # Start a new prod_statusance
+            output.append( ' ' + prod_status + ":\n" )
+            #if( prod_status == 'public' ): prod_status = 'prd';
+
+            # Build the hostname
+            hostname, short_hostname = build_hostname( site, prod_status, site_conf )
+
+            output.append( '  Host:            ' + hostname + "\n" );
+
+            # Start the http checks, they run while the DNS lookup is done
+            checks = start_checks( probe_pool, hostname, short_hostname, site_conf )
+
+            # DNS Lookup
+            dns_response = dns_query( hostname )
+            if( dns_response.answer ):
+                # The A query answers with the CNAME chain and the addresses
+                for dns_answer in dns_response.answer:
+                    if( conf['DEBUG'] ): output.append( '  DNS:             ' + str( dns_answer ) + "\n" )
                     else:
-                        hostname       = sites_data['sites'][site][prod_status]['host'] + '.' + sites_data['sites'][site][prod_status]['domain'];
-                        short_hostname = sites_data['sites'][site][prod_status]['host'];
+                        dns_record_type = dns.rdatatype.to_text( dns_answer.rdtype )
+                        for dns_record in dns_answer:
+                            output.append( '  DNS:             ' + dns_record_type + ' ' + dns_record.to_text() + "\n" )
+            else:
+                if( conf['DEBUG'] ): output.append( '  DNS: FAIL               ' + str( dns_response ) + "\n" )
+                else: output.append( "  DNS: FAIL\n" )
+
+            # Check page loaded string
+            if( 'string' in checks ):
+                output.append( '  URL:             https://' + hostname + ':443' + site_conf['path'] + "\n" )
+                output.append( '  Page-String:     '  + checks['string'].result() + ' (' + conf['STRING'] + ")\n" )
+
+            # Check site redirect
+            if( 'redirect' in checks ):
+                output.append( '  URL:             https://' + hostname + ':443' + "\n" )
+                output.append( '  Redirect:        '  + checks['redirect'].result() + "\n" )
+
+            # Check http redirect to https
+            if( 'http-redir' in checks ):
+                output.append( '  Redirect->HTTPS: '  + checks['http-redir'].result() + "\n" )
+
+            # Check /check, both http and https
+            if( 'http' in checks ):
+                output.append( '  Check-HTTP:      '  + checks['http'].result() + "\n" )
+            if( 'https' in checks ):
+                output.append( '  Check-HTTPS:     '  + checks['https'].result() + "\n" )
+
+            # Check /server-status
+            if( 'status' in checks ):
+                server_status_check, server_status_requests, server_load_avg = checks['status'].result()
+                if( 'PASS' in server_status_check ):
+                    output.append( '  Server-Status:   ' + server_status_check + ' (' + server_status_requests + ")\n" )
                 else:
-                    hostname       = site + '-' + prod_status + '.' + sites_data['sites'][site][prod_status]['domain'];
-                    short_hostname = site + '-' + prod_status;
-
-                sys.stdout.write( '  Host:            ' + hostname + "\n" );
-
-                # DNS Lookup
-                ADDITIONAL_RDCLASS = 65535
-                dns_domain = dns.name.from_text( hostname )
-                if( not dns_domain.is_absolute() ): dns_domain = dns_domain.concatenate( dns.name.root );
-                dns_request = dns.message.make_query( dns_domain, dns.rdatatype.ANY )
-                dns_response = dns.query.udp( dns_request, conf['DNS_SERVER'] )
-                if( dns_response.answer ):
-                    for dns_answer in dns_response.answer:
-                        dns_record_type = re.split( ' ', str( dns_answer ) )[3];
-                        dns_record_dest = re.split( ' ', str( dns_answer ) )[4];
-                        if( dns_record_type == 'CNAME' or dns_record_type == 'A' or dns_record_type == 'AAAA' ):
-                            if( conf['DEBUG'] ): print( '  DNS:             ', dns_answer, sep='', end='\n', file=sys.stdout, flush=False )
-                            else:                print( '  DNS:             ', dns_record_type, ' ', dns_record_dest, sep='', end='\n', file=sys.stdout, flush=False )
-                        else:
-                            if( conf['DEBUG'] ): print( '  DNS:             ', dns_response, sep='', end='\n', file=sys.stdout, flush=False )
+                    output.append( '  Server-Status:   ' + server_status_check + "\n" )
 
+            # Check /server-info
+            if( 'info' in checks ):
+              output.append( '  Server-Info:     '  + checks['info'].result() + "\n" )
+
+            # Check /php-info
+            if( 'php' in checks ):
+                php_info_check, php_info_version = checks['php'].result()
+                if( 'PASS' in php_info_check ):
+                    output.append( '  PHP-Info:        '  + php_info_check + ' (' + php_info_version + ")\n" )
                 else:
-                    if( conf['DEBUG'] ): print( '  DNS: FAIL               ' , dns_response, sep='', end='\n', file=sys.stdout, flush=False )
-                    else: print( '  DNS: FAIL', sep='', end='\n', file=sys.stdout, flush=False )
-
-                # Check page loaded string
-                if( sites_data['sites'][site][prod_status]['check-string'] == True ):
-                    if( 'path' in sites_data['sites'][site][prod_status].keys() ):
-                        sys.stdout.write( '  URL:             https://' + hostname + ':443' + sites_data['sites'][site][prod_status]['path'] + "\n" )
-                        sys.stdout.write( '  Page-String:     '  + check_http_str( hostname, hostname, '443', sites_data['sites'][site][prod_status]['path'], conf['STRING'] ) + ' (' + conf['STRING'] + ")\n" )
-
-                # Check site redirect
-                if( sites_data['sites'][site][prod_status]['check-redirect'] == True ):
-                   if( 'redirect' in sites_data['sites'][site][prod_status].keys() ):
-                        sys.stdout.write( '  URL:             https://' + hostname + ':443' + "\n" )
-                        sys.stdout.write( '  Redirect:        '  + check_http_redirect( hostname, hostname, '443', '/' ) + "\n" )
-
-                # Check http redirect to https
-                if( sites_data['sites'][site][prod_status]['check-http-redir'] == True ):
-                    sys.stdout.write( '  Redirect->HTTPS: '  + check_http_redirect( hostname, hostname, '80',  '/' ) + "\n" )
-
-                # Check /check, both http and https
-                if( sites_data['sites'][site][prod_status]['check-http'] == True ):
-                    sys.stdout.write( '  Check-HTTP:      '  + check_http_str(      hostname, hostname, '80', '/check', conf['STRING'] ) + "\n" )
-                if( sites_data['sites'][site][prod_status]['check-https'] == True ):
-                    sys.stdout.write( '  Check-HTTPS:     '  + check_http_str(      hostname, hostname, '443', '/check', conf['STRING'] ) + "\n" )
-
-                # Check /server-status
-                if( sites_data['sites'][site][prod_status]['check-status'] == True ):
-                    server_status_check = check_http_cmd( hostname, hostname, '443', '/server-status' );
-                    if( re.search( 'PASS', server_status_check ) ):
-                        server_status_requests =  wget_match_str( hostname, '80', '/server-status', 'requests currently being processed'  )
-                        server_status_requests = server_status_requests.strip( '<dt>' );
-                        server_status_requests = server_status_requests.strip( '</dt>' );
-                        server_status_requests = re.sub( 'requests currently being processed', 'current', server_status_requests );
-                        sys.stdout.write( '  Server-Status:   ' + server_status_check + ' (' + server_status_requests + ")\n" )
-                    else:
-                        sys.stdout.write( '  Server-Status:   ' + server_status_check + "\n" )
-
-                # Check /server-info
-                if( sites_data['sites'][site][prod_status]['check-info'] == True ):
-                  sys.stdout.write( '  Server-Info:     '  + check_http_cmd( hostname, hostname, '443', '/server-info' ) + "\n" )
-
-                # Check /php-info
-                if( sites_data['sites'][site][prod_status]['check-php'] == True ):
-                    php_info_check = check_http_str( hostname, hostname, '443', '/php-info', 'PHP Version' );
-                    if( re.search( 'PASS', php_info_check ) ):
-                        php_info_version = wget_match_str( hostname, '80', '/php-info', 'PHP Version <' )
-                        php_info_version = re.sub( '<.*?>' , '', php_info_version )
-                        php_info_version = re.sub( 'PHP Version ' , '', php_info_version )
-                        php_info_version = re.sub( ' ' , '', php_info_version )
-                        sys.stdout.write( '  PHP-Info:        '  + php_info_check + ' (' + php_info_version + ")\n" )
+                    output.append( '  PHP-Info:        '  + php_info_check + "\n" )
+
+            # Check LoadBalancer
+            if( 'lb' in checks ):
+                output.append( '  LB-Check:        ' + checks['lb'].result() + "\n" )
+
+            # Check each server
+            if( 'servers' in checks ):
+                total_requests = 0;
+                total_idle = 0;
+                for number, server_check in checks['servers']:
+                    server_http_check, server_status_check, server_status_requests, server_load_avg = server_check.result()
+                    output.append( '  Server ' + prod_status + number + ':    ' + server_http_check )
+                    if( 'PASS' in server_status_check ):
+                        server_status_counts = RE_DIGITS.findall( server_status_requests )
+                        total_requests += int( server_status_counts[0] );
+                        total_idle     += int( server_status_counts[1] );
+                        output.append( ' (' + server_status_requests + ', ' + server_load_avg + ")\n" )
                     else:
-                        sys.stdout.write( '  PHP-Info:        '  + php_info_check + "\n" )
-
-                # Check LoadBalancer
-                if( sites_data['sites'][site][prod_status]['check-lb'] == True ):
-                    if( 'lb' in sites_data['sites'][site][prod_status].keys() ):
-                        sys.stdout.write( '  LB-Check:        ' + check_http_cmd( hostname, sites_data['sites'][site][prod_status]['lb'], '443', '/check' ) + "\n" )
-
-                # Check each server
-                if( sites_data['sites'][site][prod_status]['check-servers'] == True ):
-                    if( 'servers' in sites_data['sites'][site][prod_status].keys() ):
-                        total_requests = 0;
-                        total_idle = 0;
-                        for number in sites_data['sites'][site][prod_status]['servers']:
-                            server_name = short_hostname + number + '.' + sites_data['sites'][site][prod_status]['domain'];
-                            sys.stdout.write( '  Server ' + prod_status + number + ':    ' + check_http_str( server_name, server_name, '80',  '/check', conf['STRING'] ) )
-                            server_status_check = check_http_cmd( server_name, server_name, '80', '/server-status' );
-                            if( re.search( 'PASS', server_status_check ) ):
-                                server_status_requests = wget_match_str( server_name, '80', '/server-status', 'requests currently being processed'  )
-                                server_status_requests = server_status_requests.strip( '<dt>' );
-                                server_status_requests = server_status_requests.strip( '</dt>' );
-                                server_status_requests = re.sub( 'requests currently being processed', 'current', server_status_requests );
-                                total_requests += int( re.findall( '\d+', server_status_requests )[0] );
-                                total_idle     += int( re.findall( '\d+', server_status_requests )[1] );
-                                server_load_avg = wget_match_str( server_name, '80', '/server-status', 'Server load:'  )
-                                server_load_avg = server_load_avg.strip( '<dt>Server ' );
-                                server_load_avg = server_load_avg.strip( '</dt>' );
-                                sys.stdout.write( ' (' + server_status_requests + ', ' + server_load_avg + ")\n" )
-                            else:
-                                sys.stdout.write( " (FAIL)\n" )
-                        sys.stdout.write( '  Server Totals:            (' + str( total_requests ) + ' current, ' + str( total_idle ) + ' idle workers)' + "\n" );
-
-                # Check application health
-                if( sites_data['sites'][site][prod_status]['check-health'] == True ):
-                    if( 'health' in sites_data['sites'][site][prod_status].keys() ):
-                        sys.stdout.write( '  Health:          ' + check_http_cmd( hostname, hostname, '443', sites_data['sites'][site][prod_status]['health'] ) + ' ' + sites_data['sites'][site][prod_status]['health'] + "\n" )
-
-## End ##
-exit()
+                        output.append( " (FAIL)\n" )
+                output.append( '  Server Totals:            (' + str( total_requests ) + ' current, ' + str( total_idle ) + ' idle workers)' + "\n" );
+
+            # Check application health
+            if( 'health' in checks ):
+                output.append( '  Health:          ' + checks['health'].result() + ' ' + site_conf['health'] + "\n" )
+
+    ## Return ##
+    return( ''.join( output ) )
+
+#######################
+def parse_options( ):
+    ## Main ##
+    # Parsing arguments
+    parser = argparse.ArgumentParser( usage='%(prog)s [options] <site> <site> <site>' )
+    parser.add_argument( '-v', '--verbose',  action='count', default=0,           help='Enable verbose output' )
+    parser.add_argument( '-d', '--debug',    action='count', default=0,           help='Enable debug output' )
+    parser.add_argument( '-f', '--file',     default=conf['SITES_FILE'],          help='Site data file', metavar='<file>' )
+    parser.add_argument(       '--dev',      action='append_const', dest='envs', const='dev',      help='Only dev instances' )
+    parser.add_argument(       '--tst',      action='append_const', dest='envs', const='tst',      help='Only tst instances' )
+    parser.add_argument(       '--stg',      action='append_const', dest='envs', const='stg',      help='Only stg instances' )
+    parser.add_argument(       '--pre',      action='append_const', dest='envs', const='pre',      help='Only pre instances' )
+    parser.add_argument(       '--prd',      action='append_const', dest='envs', const='prd',      help='Only prd instances' )
+    parser.add_argument(       '--public',   action='append_const', dest='envs', const='public',   help='Only public instances' )
+    parser.add_argument(       '--internal', action='append_const', dest='envs', const='internal', help='Only internal instances' )
+    parser.add_argument(       '--noauth',   action='store_true',                 help='No authentication' )
+    parser.add_argument(       '--list',     action='store_const', dest='mode', const='LIST',    help='List sites' )
+    parser.add_argument(       '--list-all', action='store_const', dest='mode', const='LISTALL', help='List all sites instances' )
+    parser.add_argument( 'sites', nargs='*', metavar='<site>',                    help='Only check these sites' )
+    args = parser.parse_intermixed_args()
+
+    conf['VERBOSE']    = args.verbose
+    conf['DEBUG']      = args.debug
+    conf['SITES_FILE'] = args.file
+    conf['ENVS']       = frozenset( args.envs or [ ] )
+    if( args.noauth ): conf['AUTH'] = [ ]
+    if( args.mode ):   conf['MODE'] = args.mode
+    build_check_http_argv( )
+
+    ## Return ##
+    return( args.sites )
+
+#######################
+def main( ):
+    ## Variables ##
+
+    site_input_list = parse_options( )
+    site_input_set  = frozenset( site_input_list )
+
+    ## Main ##
+    if conf['DEBUG']: print( 'Input list: ', site_input_list, len(site_input_list) )
+
+    # Load yaml file site data
+    with open( conf['SITES_FILE'], 'rb' ) as sites_file:
+        sites_data = yaml.load( sites_file, Loader=SafeLoader )
+
+    if( conf['DEBUG'] > 1 ):
+        print( "Site data dump:\n" )
+        pprint.pprint( sites_data )
+        print( "\n" )
+
+    if( conf['DEBUG'] ):
+        print( "Config data dump:\n" )
+        pprint.pprint( conf )
+        print( "\n" )
+
+    # List mode
+    if( conf['MODE'] == 'LIST' ):
+        sys.stdout.write( ''.join( site + '\n' for site in sites_data["sites"] ) )
+
+    # List mode
+    if( conf['MODE'] == 'LISTALL' ):
+        sys.stdout.write( ''.join( site + '-' + prod_status + '\n'
+                                   for site in sites_data["sites"]
+                                   for prod_status in sites_data["sites"][site].keys() ) )
+
+    # Check mode, Parse all sites
+    if( conf['MODE'] == 'CHECK' ):
+      probe_pool = ThreadPoolExecutor( max_workers=conf['WORKERS'] )
+      # Site threads only queue probes and wait, a few sites are enough to keep the probe pool full
+      site_pool  = ThreadPoolExecutor( max_workers=conf['SITE_WORKERS'] )
+
+      # Are we picking from a list of sites, or doing all the sites?
+      check_sites = [ site for site in sites_data["sites"] if( ( not site_input_set ) or ( site in site_input_set ) ) ]
+
+      # Look up every selected hostname up front
+      dns_prefetch( [ build_hostname( site, prod_status, site_conf )[0]
+                      for site in check_sites
+                      for prod_status, site_conf in sites_data["sites"][site].items()
+                      if( check_prod_status( prod_status ) ) ] )
+
+      try:
+          # Check the sites concurrently, the reports are written in order
+          site_checks = [ site_pool.submit( check_site, probe_pool, site, sites_data["sites"][site] ) for site in check_sites ]
+          for site_check in site_checks:
+              sys.stdout.write( site_check.result() )
+      finally:
+          # If a site check failed, drop the queued work instead of finishing every site first
+          site_pool.shutdown( wait=False, cancel_futures=True )
+          probe_pool.shutdown( cancel_futures=True )
+          site_pool.shutdown( )
+          if( dns_sock is not None ): dns_sock.close()
+
+    ## Return ##
+    return( )
+
+#################################################
+## Main ##
+
+if( __name__ == '__main__' ):
+    main( )
+    sys.exit( )